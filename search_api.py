@@ -7,13 +7,22 @@ It returns found links which can then be verified by the Link Verification API.
 Port: 5001
 """
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, ValidationError
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
 import aiohttp
+import orjson
 import asyncio
-from typing import List, Dict, Any, Optional
+import atexit
+import logging
+import os
+import queue
+import re
+import time
+import uuid
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Dict, Any, Optional, Tuple
 import urllib.parse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
@@ -26,26 +35,88 @@ from slowapi.errors import RateLimitExceeded
 app = FastAPI(
     title="Price Pilot Search API",
     description="Multi-retailer Google Custom Search service for price comparison",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS for Chrome extension requests only
 # This allows ANY Chrome extension during development,
 # later in production we will use a specific extension ID to prevent abuse.
-app.add_middleware(
-    CORSMiddleware,
-    allow_origin_regex=r"^chrome-extension://[a-z]{32}$",
-    allow_credentials=True,
-    allow_methods=["POST", "GET", "OPTIONS"],
-    allow_headers=["Content-Type", "Accept"],
-)
+_ORIGIN_RE = re.compile(rb"^chrome-extension://[a-z]{32}$")
+
+_CORS_PREFLIGHT_HEADERS = [
+    (b"access-control-allow-methods", b"POST, GET, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type, Accept"),
+    (b"access-control-max-age", b"600"),
+]
+
+
+class ChromeExtensionCORSMiddleware:
+    """Minimal CORS middleware for chrome-extension origins.
+
+    Replaces Starlette's CORSMiddleware on the hot path: one compiled regex
+    match against the raw origin header bytes (no decode), and non-matching
+    requests pass straight through with no extra work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        is_preflight = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                is_preflight = True
+
+        if origin is None or not _ORIGIN_RE.match(origin):
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = [
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+
+        if is_preflight and scope["method"] == "OPTIONS":
+            # Answer preflights directly without entering the app
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": cors_headers + _CORS_PREFLIGHT_HEADERS,
+            })
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + cors_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+app.add_middleware(ChromeExtensionCORSMiddleware)
 
 # =============================================================================
 # RATE LIMITING
 # =============================================================================
 
-# Initialize rate limiter with IP-based limiting
-limiter = Limiter(key_func=get_remote_address)
+# Initialize rate limiter with IP-based limiting. slowapi's default in-memory
+# storage only limits per instance - with N Cloud Run instances the effective
+# per-IP budget is N times the configured limit. Point RATE_LIMIT_STORAGE_URI
+# at Redis (e.g. Memorystore, redis://host:6379) for a truly global limit.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=os.environ.get('RATE_LIMIT_STORAGE_URI', 'memory://')
+)
 app.state.limiter = limiter
 
 # Custom exception handler for rate limit exceeded
@@ -57,49 +128,74 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     )
 
 # =============================================================================
-# CONFIGURATION & SECRETS
+# LOGGING
 # =============================================================================
 
-from google.cloud import secretmanager
+# Log records go through an in-memory queue so the event loop never blocks on
+# stdout/stderr writes (which can stall under Cloud Run log ingestion pressure).
+# A background QueueListener thread does the actual I/O.
+log = logging.getLogger("search_api")
 
-# Initialize Secret Manager client
-_secrets_cache = {}
+_log_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+_log_listener: Optional[QueueListener] = None
 
-def get_secret(secret_name: str) -> str:
-    """Retrieve a secret from Google Secret Manager."""
-    if secret_name in _secrets_cache:
-        return _secrets_cache[secret_name]
-    
-    try:
-        project_id = "price-pilot-1765213055260"
-        client = secretmanager.SecretManagerServiceClient()
-        resource_name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
-        response = client.access_secret_version(request={"name": resource_name})
-        secret_value = response.payload.data.decode("UTF-8")
-        _secrets_cache[secret_name] = secret_value
-        return secret_value
-    except Exception as e:
-        print(f"Error retrieving secret '{secret_name}': {str(e)}")
-        raise
 
-# Fetch credentials from Secret Manager
+def _configure_logging() -> None:
+    """Wire the search_api logger to a queue drained by a background thread."""
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    )
+
+    log.addHandler(QueueHandler(_log_queue))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+    _log_listener = QueueListener(_log_queue, stream_handler)
+    _log_listener.start()
+    # The listener thread is a daemon; drain the queue on interpreter exit so
+    # records logged just before SIGTERM/scale-down aren't silently dropped
+    atexit.register(_log_listener.stop)
+
+
+_configure_logging()
+
+
+# =============================================================================
+# CONFIGURATION & SECRETS
+# =============================================================================
+
+# Credentials are injected as environment variables by Cloud Run's secret
+# integration (--set-secrets), so cold starts skip the Secret Manager RPC
+# and the runtime image doesn't need the secretmanager client at all.
 try:
-    GOOGLE_API_KEY = get_secret('GOOGLE_API_KEY')
-    GOOGLE_CX = get_secret('GOOGLE_CX')
-    print("✅ Secrets loaded from Google Secret Manager")
-except Exception as e:
-    print(f"❌ Failed to load secrets: {str(e)}")
+    GOOGLE_API_KEY = os.environ['GOOGLE_API_KEY']
+    GOOGLE_CX = os.environ['GOOGLE_CX']
+except KeyError as e:
+    log.error(f"Missing required environment variable: {e.args[0]}")
     raise SystemExit(1)
 
-# Concurrency limit for parallel searches
-# Increased to 10 for faster retailer search processing
+# Concurrency limit for parallel searches, enforced by the shared session's
+# TCPConnector per-host cap rather than an asyncio.Semaphore
 MAX_CONCURRENT_SEARCHES = 10
 
 # Request timeout in seconds
 REQUEST_TIMEOUT = 10
 
-# UK Retailers list
-UK_RETAILERS = [
+# Built once - set on the shared session so individual calls don't allocate
+# a fresh ClientTimeout each time
+_CLIENT_TIMEOUT = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+# Stop waiting once this many retailer results have arrived; stragglers are
+# cancelled so p95 latency tracks the median retailer RTT, not the slowest.
+RESULT_TARGET = 15
+
+# UK Retailers list - frozen to a tuple since it never changes at runtime
+UK_RETAILERS = (
     'amazon.co.uk',
     'argos.co.uk',
     'currys.co.uk',
@@ -129,17 +225,227 @@ UK_RETAILERS = [
     'scan.co.uk',
     'overclockers.co.uk',
     'ebuyer.com'
+)
+
+# Keyword categories for specialist retailers. A specialist is only queried
+# when the product query shares a token with its category - site:scan.co.uk
+# will never have results for "lipstick". Retailers without an entry (the
+# generalists: Amazon, Argos, John Lewis, the supermarkets, ...) are always
+# queried.
+_RETAILER_CATEGORIES = {
+    'currys.co.uk': {
+        'tv', 'laptop', 'laptops', 'monitor', 'tablet', 'phone', 'camera', 'printer',
+        'headphones', 'console', 'fridge', 'freezer', 'washing', 'dishwasher',
+        'microwave', 'hoover', 'vacuum', 'speaker', 'soundbar', 'gaming'
+    },
+    'scan.co.uk': {
+        'gpu', 'cpu', 'pc', 'ram', 'ssd', 'motherboard', 'graphics', 'processor',
+        'keyboard', 'mouse', 'monitor', 'laptop', 'laptops', 'gaming', 'nvidia',
+        'amd', 'intel', 'psu', 'cooler'
+    },
+    'overclockers.co.uk': {
+        'gpu', 'cpu', 'pc', 'ram', 'ssd', 'motherboard', 'graphics', 'processor',
+        'keyboard', 'mouse', 'monitor', 'gaming', 'nvidia', 'amd', 'intel',
+        'psu', 'cooler', 'watercooling'
+    },
+    'ebuyer.com': {
+        'gpu', 'cpu', 'pc', 'ram', 'ssd', 'motherboard', 'laptop', 'laptops',
+        'monitor', 'printer', 'router', 'keyboard', 'mouse', 'gaming', 'tablet'
+    },
+    'boots.com': {
+        'beauty', 'cosmetic', 'cosmetics', 'makeup', 'skincare', 'lipstick',
+        'mascara', 'foundation', 'perfume', 'fragrance', 'shampoo', 'moisturiser',
+        'vitamins', 'toothpaste', 'suncream', 'serum'
+    },
+    'superdrug.com': {
+        'beauty', 'cosmetic', 'cosmetics', 'makeup', 'skincare', 'lipstick',
+        'mascara', 'foundation', 'perfume', 'fragrance', 'shampoo', 'moisturiser',
+        'vitamins', 'toothpaste', 'serum'
+    },
+    'asos.com': {
+        'dress', 'jeans', 'shirt', 'tshirt', 'jacket', 'coat', 'skirt', 'shoes',
+        'trainers', 'boots', 'hoodie', 'jumper', 'top', 'shorts', 'fashion'
+    },
+    'next.co.uk': {
+        'dress', 'jeans', 'shirt', 'jacket', 'coat', 'skirt', 'shoes', 'boots',
+        'jumper', 'top', 'shorts', 'suit', 'pyjamas', 'kids', 'clothing'
+    },
+    'simply-be.co.uk': {
+        'dress', 'jeans', 'shirt', 'jacket', 'coat', 'skirt', 'shoes', 'boots',
+        'jumper', 'top', 'lingerie', 'clothing'
+    },
+    'jd.com': {
+        'trainers', 'sneakers', 'hoodie', 'tracksuit', 'nike', 'adidas', 'puma',
+        'football', 'running', 'gym', 'sportswear'
+    },
+    'footpatrol.com': {
+        'trainers', 'sneakers', 'nike', 'adidas', 'jordan', 'yeezy', 'newbalance'
+    },
+    'size.co.uk': {
+        'trainers', 'sneakers', 'nike', 'adidas', 'jordan', 'hoodie', 'tracksuit'
+    },
+    'wickes.co.uk': {
+        'paint', 'timber', 'drill', 'tiles', 'cement', 'plasterboard', 'decking',
+        'insulation', 'radiator', 'flooring', 'fencing', 'diy'
+    },
+    'b-and-q.co.uk': {
+        'paint', 'timber', 'drill', 'tiles', 'cement', 'plasterboard', 'decking',
+        'insulation', 'radiator', 'flooring', 'fencing', 'garden', 'lawnmower', 'diy'
+    },
+    'screwfix.com': {
+        'drill', 'screwdriver', 'hammer', 'saw', 'sander', 'wrench', 'ladder',
+        'workwear', 'sealant', 'screws', 'fixings', 'tools', 'diy'
+    },
+    'halfords.com': {
+        'bike', 'bicycle', 'cycling', 'helmet', 'car', 'battery', 'tyre', 'tyres',
+        'wiper', 'dashcam', 'roofbox', 'scooter', 'motoring'
+    },
+    'dunelm.com': {
+        'curtains', 'bedding', 'duvet', 'pillow', 'cushion', 'rug', 'lamp',
+        'mirror', 'blinds', 'towels', 'mattress', 'furniture'
+    },
+    'ikea.com/gb': {
+        'desk', 'wardrobe', 'sofa', 'bookcase', 'shelf', 'shelving', 'table',
+        'chair', 'drawers', 'mattress', 'bed', 'furniture', 'storage'
+    },
+}
+
+
+def select_retailers(normalized_query: str) -> List[str]:
+    """Pick the retailers worth querying for this product query.
+
+    Generalist retailers are always included; specialists only when the query
+    shares a token with their category keywords.
+    """
+    tokens = set(normalized_query.split())
+    selected = []
+    for retailer in UK_RETAILERS:
+        keywords = _RETAILER_CATEGORIES.get(retailer)
+        if keywords is None or tokens & keywords:
+            selected.append(retailer)
+    return selected
+
+
+# Pre-built, URL-encoded query prefixes - one per retailer, computed once at
+# import time so each request only quotes the product query and concatenates.
+_RETAILER_URL_PREFIXES = [
+    (
+        retailer,
+        f'https://www.googleapis.com/customsearch/v1'
+        f'?key={GOOGLE_API_KEY}&cx={GOOGLE_CX}&q=site%3A{urllib.parse.quote(retailer)}+'
+    )
+    for retailer in UK_RETAILERS
 ]
 
 
 # =============================================================================
-# PYDANTIC MODELS
+# RESULT CACHE
 # =============================================================================
 
-class SearchRequest(BaseModel):
-    searchQuery: str
-    productTitle: Optional[str] = None
+# Per-process LRU cache of (retailer, normalized query) -> search result.
+# Hot queries repeat across users, so cache hits skip the Google round-trip
+# entirely. Single event loop per process means no locking is needed.
+SEARCH_CACHE_TTL = 3600
+# "No results" pairs (e.g. site:scan.co.uk lipstick) are cached too, but with a
+# shorter TTL since new stock could start matching at any time.
+SEARCH_CACHE_NEGATIVE_TTL = 300
+SEARCH_CACHE_MAX_ENTRIES = 2048
+
+# Entries are (stored_at, ttl, value) tuples to keep the per-entry footprint small.
+_search_cache: 'OrderedDict[Tuple[str, str], Tuple[float, float, Dict[str, Any]]]' = OrderedDict()
+_CACHE_MISS = object()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query for cache keying (lowercase, collapsed whitespace)."""
+    return ' '.join(query.lower().split())
+
+
+def _cache_get(key: Tuple[str, str]) -> Any:
+    """Return the cached value for key, or _CACHE_MISS if absent or expired."""
+    entry = _search_cache.get(key)
+    if entry is None:
+        return _CACHE_MISS
+
+    stored_at, ttl, value = entry
+    if time.monotonic() - stored_at > ttl:
+        del _search_cache[key]
+        return _CACHE_MISS
 
+    _search_cache.move_to_end(key)
+    return value
+
+
+def _cache_put(key: Tuple[str, str], value: Dict[str, Any], ttl: float = SEARCH_CACHE_TTL) -> None:
+    """Store value under key, evicting least-recently-used entries past the cap."""
+    _search_cache[key] = (time.monotonic(), ttl, value)
+    _search_cache.move_to_end(key)
+    while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+        _search_cache.popitem(last=False)
+
+
+# =============================================================================
+# SHARED HTTP SESSION
+# =============================================================================
+
+def _create_session() -> aiohttp.ClientSession:
+    """Build the shared aiohttp session with pooled, keep-alive connections."""
+    return aiohttp.ClientSession(
+        timeout=_CLIENT_TIMEOUT,
+        connector=aiohttp.TCPConnector(
+            limit=64,
+            # Every retailer query hits www.googleapis.com, so the per-host cap
+            # is the one that matters; the connector queues surplus requests,
+            # replacing the old asyncio.Semaphore.
+            limit_per_host=MAX_CONCURRENT_SEARCHES,
+            ttl_dns_cache=300,
+            use_dns_cache=True,
+            enable_cleanup_closed=True,
+            keepalive_timeout=75
+        )
+    )
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the app-wide session, creating it if startup hasn't run (e.g. tests)."""
+    session = getattr(app.state, 'session', None)
+    if session is None or session.closed:
+        session = _create_session()
+        app.state.session = session
+    return session
+
+
+@app.on_event("startup")
+async def create_http_session():
+    """Create the shared HTTP session so TLS connections are reused across requests."""
+    app.state.session = _create_session()
+
+    # One-time credentials check instead of probing Google on every /search.
+    # Bad credentials are also caught reactively via 401/403 on retailer calls.
+    # Only a definite 401/403 trips the fail-fast flag - transient startup
+    # failures (network, timeout) must not disable the service.
+    api_test = await test_api_credentials(app.state.session)
+    if api_test['success']:
+        log.info("Google Custom Search credentials verified")
+    elif api_test.get('status') in (401, 403):
+        app.state.credentials_ok = False
+        app.state.credentials_error = api_test['error']
+        log.warning(f"Credentials rejected at startup: {api_test['error']}")
+    else:
+        log.warning(f"Credentials check failed at startup: {api_test['error']}")
+
+
+@app.on_event("shutdown")
+async def close_http_session():
+    """Close the shared HTTP session on shutdown."""
+    session = getattr(app.state, 'session', None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+# =============================================================================
+# PYDANTIC MODELS
+# =============================================================================
 
 class SearchResult(BaseModel):
     retailer: str
@@ -181,28 +487,17 @@ class RetailersResponse(BaseModel):
 # HELPER FUNCTIONS
 # =============================================================================
 
-def generate_retailer_queries(product_query: str) -> List[Dict[str, str]]:
-    """Generate site-specific search queries for each UK retailer."""
-    return [
-        {
-            'retailer': retailer,
-            'query': f'site:{retailer} {product_query}'
-        }
-        for retailer in UK_RETAILERS
-    ]
-
-
 async def test_api_credentials(session: aiohttp.ClientSession) -> Dict[str, Any]:
     """Test Google Custom Search API credentials with a simple query."""
     test_url = f'https://www.googleapis.com/customsearch/v1?key={GOOGLE_API_KEY}&cx={GOOGLE_CX}&q=test'
     
     try:
-        async with session.get(test_url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
-            data = await response.json()
+        async with session.get(test_url) as response:
+            data = await response.json(loads=orjson.loads)
             
             if response.status != 200 or 'error' in data:
                 error_msg = data.get('error', {}).get('message', f'HTTP {response.status}')
-                return {'success': False, 'error': error_msg}
+                return {'success': False, 'error': error_msg, 'status': response.status}
             
             return {'success': True}
             
@@ -212,153 +507,409 @@ async def test_api_credentials(session: aiohttp.ClientSession) -> Dict[str, Any]
         return {'success': False, 'error': str(e)}
 
 
+def _http_error_result(retailer: str, status_code: int, body_text: str) -> Dict[str, Any]:
+    """Build an error result for a non-200 Google response without parsing it."""
+    # Don't parse multi-KB error payloads - a short snippet is enough
+    error_msg = f'HTTP {status_code}: {body_text[:200]}'
+    if status_code in (401, 403):
+        # Credentials problem - flag it so later requests fail fast
+        app.state.credentials_ok = False
+        app.state.credentials_error = error_msg
+        return {
+            'retailer': retailer,
+            'status': 'error',
+            'error': error_msg,
+            'authError': True,
+            'result': None
+        }
+    return {
+        'retailer': retailer,
+        'status': 'error',
+        'error': error_msg,
+        'result': None
+    }
+
+
+def _result_from_google_data(
+    retailer: str,
+    cache_key: Tuple[str, str],
+    data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Build (and cache) a retailer result from a parsed Google search payload."""
+    if 'error' in data:
+        return {
+            'retailer': retailer,
+            'status': 'error',
+            'error': data['error'].get('message', 'Unknown error'),
+            'result': None
+        }
+
+    # Check if we got any results
+    items = data.get('items', [])
+    if not items:
+        no_result = {
+            'retailer': retailer,
+            'status': 'success',
+            'result': None
+        }
+        _cache_put(cache_key, no_result, ttl=SEARCH_CACHE_NEGATIVE_TTL)
+        return no_result
+
+    # Return the first result
+    first_item = items[0]
+    search_result = {
+        'retailer': retailer,
+        'status': 'success',
+        'result': {
+            'link': first_item.get('link', ''),
+            'title': first_item.get('title', ''),
+            'snippet': first_item.get('snippet', '')
+        }
+    }
+    _cache_put(cache_key, search_result)
+    return search_result
+
+
 async def search_retailer(
     session: aiohttp.ClientSession,
-    semaphore: asyncio.Semaphore,
     retailer: str,
-    query: str
+    url: str,
+    normalized_query: str
 ) -> Dict[str, Any]:
     """Perform a Google Custom Search for a specific retailer."""
-    async with semaphore:
-        encoded_query = urllib.parse.quote(query)
-        url = f'https://www.googleapis.com/customsearch/v1?key={GOOGLE_API_KEY}&cx={GOOGLE_CX}&q={encoded_query}'
-        
-        try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
-                data = await response.json()
-                
-                if response.status != 200:
-                    error_msg = data.get('error', {}).get('message', f'HTTP {response.status}')
-                    return {
-                        'retailer': retailer,
-                        'status': 'error',
-                        'error': error_msg,
-                        'result': None
-                    }
-                
-                if 'error' in data:
-                    return {
-                        'retailer': retailer,
-                        'status': 'error',
-                        'error': data['error'].get('message', 'Unknown error'),
-                        'result': None
-                    }
-                
-                # Check if we got any results
-                items = data.get('items', [])
-                if not items:
-                    return {
-                        'retailer': retailer,
-                        'status': 'success',
-                        'result': None
-                    }
-                
-                # Return the first result
-                first_item = items[0]
-                return {
-                    'retailer': retailer,
-                    'status': 'success',
-                    'result': {
-                        'link': first_item.get('link', ''),
-                        'title': first_item.get('title', ''),
-                        'snippet': first_item.get('snippet', '')
-                    }
-                }
-                
-        except asyncio.TimeoutError:
-            return {
+    cache_key = (retailer, normalized_query)
+    cached = _cache_get(cache_key)
+    if cached is not _CACHE_MISS:
+        return cached
+
+    try:
+        async with session.get(url) as response:
+            if response.status != 200:
+                return _http_error_result(retailer, response.status, await response.text())
+
+            data = await response.json(loads=orjson.loads)
+            return _result_from_google_data(retailer, cache_key, data)
+
+    except asyncio.TimeoutError:
+        return {
+            'retailer': retailer,
+            'status': 'error',
+            'error': 'Request timed out',
+            'result': None
+        }
+    except Exception as e:
+        return {
+            'retailer': retailer,
+            'status': 'error',
+            'error': str(e),
+            'result': None
+        }
+
+
+# Google's batch endpoint accepts many customsearch calls in one HTTP request
+_BATCH_URL = 'https://www.googleapis.com/batch/customsearch/v1'
+_BATCH_CONTENT_ID_RE = re.compile(r'Content-ID:\s*<(?:response-)?item(\d+)>', re.IGNORECASE)
+
+# When a batch call fails, skip the endpoint for this long instead of paying a
+# doomed serial round-trip in front of the per-retailer fallback on every search
+BATCH_RETRY_COOLDOWN = 600
+_batch_unavailable_until = 0.0
+
+
+def _mark_batch_unavailable(reason: str) -> None:
+    """Put the batch endpoint on cooldown after a failed attempt."""
+    global _batch_unavailable_until
+    _batch_unavailable_until = time.monotonic() + BATCH_RETRY_COOLDOWN
+    log.warning(f"Batch endpoint unavailable ({reason}); retrying in {BATCH_RETRY_COOLDOWN}s")
+
+
+def _parse_batch_response(raw: str, boundary: str) -> Dict[int, Tuple[int, str]]:
+    """Split a multipart/mixed batch response into {item index: (status, body)}."""
+    parts = {}
+    for part in raw.split('--' + boundary):
+        part = part.strip()
+        if not part or part == '--':
+            continue
+
+        # Outer part headers, then the embedded HTTP response
+        split = part.split('\r\n\r\n', 2)
+        if len(split) < 3:
+            continue
+        outer_headers, embedded_head, body = split
+
+        match = _BATCH_CONTENT_ID_RE.search(outer_headers)
+        if not match:
+            continue
+
+        # Embedded status line looks like "HTTP/1.1 200 OK"
+        status_line = embedded_head.split('\r\n', 1)[0]
+        pieces = status_line.split()
+        if len(pieces) < 2 or not pieces[1].isdigit():
+            continue
+
+        parts[int(match.group(1))] = (int(pieces[1]), body)
+    return parts
+
+
+async def _batch_search_all(
+    session: aiohttp.ClientSession,
+    prefixes: List[Tuple[str, str]],
+    encoded_query: str,
+    normalized_query: str
+) -> Optional[List[Dict[str, Any]]]:
+    """Search the selected retailers in one multipart batch request to Google.
+
+    Cached retailers are answered locally; the rest go out as subrequests of a
+    single HTTP call. Returns None if the batch request fails or is on
+    cooldown, in which case the caller falls back to per-retailer requests.
+    """
+    if time.monotonic() < _batch_unavailable_until:
+        return None
+
+    results = []
+    pending = []
+    for retailer, prefix in prefixes:
+        cache_key = (retailer, normalized_query)
+        cached = _cache_get(cache_key)
+        if cached is not _CACHE_MISS:
+            results.append(cached)
+        else:
+            path = (prefix + encoded_query)[len('https://www.googleapis.com'):]
+            pending.append((retailer, cache_key, path))
+
+    if not pending:
+        return results
+
+    boundary = 'batch_' + uuid.uuid4().hex
+    body_parts = []
+    for i, (retailer, cache_key, path) in enumerate(pending):
+        body_parts.append(
+            f'--{boundary}\r\n'
+            'Content-Type: application/http\r\n'
+            f'Content-ID: <item{i}>\r\n'
+            '\r\n'
+            f'GET {path} HTTP/1.1\r\n'
+            '\r\n'
+        )
+    body_parts.append(f'--{boundary}--\r\n')
+
+    try:
+        async with session.post(
+            _BATCH_URL,
+            data=''.join(body_parts).encode('ascii'),
+            headers={'Content-Type': f'multipart/mixed; boundary={boundary}'}
+        ) as response:
+            if response.status != 200:
+                _mark_batch_unavailable(f'HTTP {response.status}')
+                return None
+
+            content_type = response.headers.get('Content-Type', '')
+            match = re.search(r'boundary=([^;]+)', content_type)
+            if not match:
+                _mark_batch_unavailable('missing multipart boundary')
+                return None
+
+            raw = await response.text()
+    except Exception as e:
+        _mark_batch_unavailable(str(e) or type(e).__name__)
+        return None
+
+    parts = _parse_batch_response(raw, match.group(1).strip('"'))
+    if not parts:
+        _mark_batch_unavailable('unparseable multipart response')
+        return None
+
+    for i, (retailer, cache_key, path) in enumerate(pending):
+        entry = parts.get(i)
+        if entry is None:
+            results.append({
                 'retailer': retailer,
                 'status': 'error',
-                'error': 'Request timed out',
+                'error': 'Missing batch response part',
                 'result': None
-            }
-        except Exception as e:
-            return {
+            })
+            continue
+
+        status_code, part_body = entry
+        if status_code != 200:
+            results.append(_http_error_result(retailer, status_code, part_body))
+            continue
+
+        try:
+            data = orjson.loads(part_body)
+        except orjson.JSONDecodeError:
+            results.append({
                 'retailer': retailer,
                 'status': 'error',
-                'error': str(e),
+                'error': 'Invalid JSON in batch response part',
                 'result': None
-            }
+            })
+            continue
+
+        results.append(_result_from_google_data(retailer, cache_key, data))
+
+    return results
+
+
+# In-progress searches keyed by normalized query. Concurrent callers with the
+# same query await one shared task instead of each firing 29 Google requests.
+_inflight: Dict[str, 'asyncio.Task[Dict[str, Any]]'] = {}
 
 
 async def perform_multi_retailer_search(search_query: str, product_title: str) -> Dict[str, Any]:
+    """Perform a multi-retailer search, coalescing identical concurrent queries."""
+    key = normalize_query(search_query)
+
+    # Single event loop per process: the check-and-set below has no await in
+    # between, so no lock is needed around the dict mutation.
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_perform_multi_retailer_search(search_query, product_title))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    return await task
+
+
+async def _perform_multi_retailer_search(search_query: str, product_title: str) -> Dict[str, Any]:
     """Perform concurrent searches across all UK retailers."""
-    async with aiohttp.ClientSession() as session:
-        # Test API credentials first
-        api_test = await test_api_credentials(session)
-        
-        if not api_test['success']:
-            print(f"API test failed: {api_test['error']}")
-            return {
-                'success': False,
-                'apiError': api_test['error'],
-                'results': [],
-                'searchQueries': [{'retailer': 'API_TEST', 'status': 'error', 'error': api_test['error']}],
-                'totalRetailers': 0,
-                'successfulSearches': 0,
-                'foundResults': 0
-            }
-        
-        # Generate queries and search concurrently
-        retailer_queries = generate_retailer_queries(search_query)
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
-        
+    session = _get_session()
+
+    # Quote the product query once and reuse the pre-built per-retailer prefixes
+    encoded_query = urllib.parse.quote_plus(search_query)
+    normalized_query = normalize_query(search_query)
+
+    # Only query retailers whose category plausibly matches the product
+    selected = set(select_retailers(normalized_query))
+    prefixes = [(r, p) for r, p in _RETAILER_URL_PREFIXES if r in selected]
+
+    # Prefer one batched round-trip for the selected retailers; fall back to
+    # concurrent per-retailer requests if the batch endpoint is unavailable.
+    search_results = await _batch_search_all(session, prefixes, encoded_query, normalized_query)
+
+    if search_results is not None:
+        seen_retailers = {sr['retailer'] for sr in search_results}
+    else:
         tasks = [
-            search_retailer(session, semaphore, rq['retailer'], rq['query'])
-            for rq in retailer_queries
+            asyncio.ensure_future(
+                search_retailer(session, retailer, prefix + encoded_query, normalized_query)
+            )
+            for retailer, prefix in prefixes
         ]
-        
-        search_results = await asyncio.gather(*tasks)
-        
-        # Process results
-        results = []
-        search_queries = []
-        
-        for sr in search_results:
-            query_status = {'retailer': sr['retailer'], 'status': sr['status']}
-            if sr.get('error'):
-                query_status['error'] = sr['error']
-            search_queries.append(query_status)
-            
-            if sr['status'] == 'success' and sr['result']:
-                results.append({
-                    'retailer': sr['retailer'],
-                    'link': sr['result']['link'],
-                    'title': sr['result']['title'],
-                    'snippet': sr['result']['snippet']
+
+        # Consume results as they arrive and return early once RESULT_TARGET
+        # retailers have produced a result, instead of waiting for the slowest one.
+        search_results = []
+        found = 0
+        try:
+            for future in asyncio.as_completed(tasks, timeout=REQUEST_TIMEOUT):
+                sr = await future
+                search_results.append(sr)
+                if sr['status'] == 'success' and sr['result']:
+                    found += 1
+                    if found >= RESULT_TARGET:
+                        break
+        except asyncio.TimeoutError:
+            pass
+
+        # Cancel stragglers, then pick up anything that finished while we were reading
+        pending = [t for t in tasks if not t.done()]
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        seen_retailers = {sr['retailer'] for sr in search_results}
+        for t in tasks:
+            if t.done() and not t.cancelled() and t.exception() is None:
+                sr = t.result()
+                if sr['retailer'] not in seen_retailers:
+                    search_results.append(sr)
+                    seen_retailers.add(sr['retailer'])
+
+    # Process results in a single pass; bind the hot attribute lookups once
+    results = []
+    search_queries = []
+    append_result = results.append
+    append_query = search_queries.append
+    successful_searches = 0
+    api_error = None
+
+    for sr in search_results:
+        retailer = sr['retailer']
+        status = sr['status']
+        error = sr.get('error')
+        result = sr.get('result')
+
+        if error:
+            append_query({'retailer': retailer, 'status': status, 'error': error})
+            if api_error is None and sr.get('authError'):
+                api_error = error
+        else:
+            append_query({'retailer': retailer, 'status': status})
+
+        if status == 'success':
+            successful_searches += 1
+            if result:
+                append_result({
+                    'retailer': retailer,
+                    'link': result['link'],
+                    'title': result['title'],
+                    'snippet': result['snippet']
                 })
-        
-        successful_searches = sum(1 for sq in search_queries if sq['status'] == 'success')
-        print(f"Search complete: {len(results)} results from {successful_searches}/{len(retailer_queries)} retailers")
-        
-        return {
-            'success': True,
-            'results': results,
-            'searchQueries': search_queries,
-            'totalRetailers': len(retailer_queries),
-            'successfulSearches': successful_searches,
-            'foundResults': len(results)
-        }
+
+    # Selected retailers whose tasks were cancelled before completing, then
+    # retailers skipped by the category filter
+    for retailer in UK_RETAILERS:
+        if retailer in seen_retailers:
+            continue
+        status = 'cancelled' if retailer in selected else 'skipped'
+        append_query({'retailer': retailer, 'status': status})
+
+    log.info(f"Search complete: {len(results)} results from {successful_searches}/{len(UK_RETAILERS)} retailers")
+
+    return {
+        'success': api_error is None,
+        'results': results,
+        'searchQueries': search_queries,
+        'totalRetailers': len(UK_RETAILERS),
+        'successfulSearches': successful_searches,
+        'foundResults': len(results),
+        'apiError': api_error
+    }
 
 
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
 
+# /health and /retailers payloads never change at runtime, so serialize them
+# once at import time and serve the pre-encoded bytes.
+_HEALTH_BODY = orjson.dumps({
+    'status': 'ok',
+    'message': 'Search API is running',
+    'port': 5001,
+    'retailers': len(UK_RETAILERS),
+    'maxConcurrency': MAX_CONCURRENT_SEARCHES
+})
+
+_RETAILERS_BODY = orjson.dumps({
+    'retailers': UK_RETAILERS,
+    'count': len(UK_RETAILERS)
+})
+
+
+# No rate limit here: the load balancer probes /health internally
 @app.get("/health", response_model=HealthResponse)
-@limiter.limit("100/minute")
-async def health_check(request: Request):
+async def health_check():
     """Health check endpoint."""
-    return {
-        'status': 'ok',
-        'message': 'Search API is running',
-        'port': 5001,
-        'retailers': len(UK_RETAILERS),
-        'maxConcurrency': MAX_CONCURRENT_SEARCHES
-    }
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
-@app.post("/search", response_model=SearchResponse)
+# SearchResponse stays in the OpenAPI schema via `responses`, but the handler
+# returns an ORJSONResponse directly so Pydantic doesn't re-validate every
+# result item on the hot path.
+@app.post("/search", responses={200: {"model": SearchResponse}})
 @limiter.limit("20/minute")
 async def search(request: Request):
     """
@@ -369,30 +920,42 @@ async def search(request: Request):
     
     Rate limited to 20 requests per minute per IP address.
     """
-    # Parse the JSON body manually since slowapi requires 'request' as the first parameter
+    # Parse the JSON body manually since slowapi requires 'request' as the first
+    # parameter; two string fields don't justify a Pydantic model on the hot path.
     try:
-        body = await request.json()
-        search_request = SearchRequest(**body)
-    except ValidationError as e:
-        # Return 422 for Pydantic validation errors
-        raise HTTPException(status_code=422, detail=str(e))
-    except Exception as e:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid request body: {str(e)}")
-    
-    search_query = search_request.searchQuery
-    product_title = search_request.productTitle or search_query
-    
-    if not search_query:
-        raise HTTPException(status_code=400, detail="Missing required field: searchQuery")
-    
-    print(f"Search request: {product_title[:60]}")
+
+    search_query = body.get('searchQuery') if isinstance(body, dict) else None
+    if not isinstance(search_query, str) or not search_query:
+        raise HTTPException(status_code=422, detail="Missing required field: searchQuery")
+
+    product_title = body.get('productTitle')
+    if not isinstance(product_title, str) or not product_title:
+        product_title = search_query
+
+    # Credentials were rejected by Google earlier - fail fast instead of
+    # fanning out another doomed multi-retailer search
+    if not getattr(app.state, 'credentials_ok', True):
+        return ORJSONResponse({
+            'success': False,
+            'apiError': getattr(app.state, 'credentials_error', None) or 'Google API credentials rejected',
+            'results': [],
+            'searchQueries': [],
+            'totalRetailers': 0,
+            'successfulSearches': 0,
+            'foundResults': 0
+        })
+
+    log.info(f"Search request: {product_title[:60]}")
     
     try:
         result = await perform_multi_retailer_search(search_query, product_title)
-        return result
+        return ORJSONResponse(result)
     except Exception as e:
-        print(f"Error in search: {str(e)}")
-        return {
+        log.error(f"Error in search: {str(e)}")
+        return ORJSONResponse({
             'success': False,
             'apiError': f'Internal error: {str(e)}',
             'results': [],
@@ -400,17 +963,14 @@ async def search(request: Request):
             'totalRetailers': 0,
             'successfulSearches': 0,
             'foundResults': 0
-        }
+        })
 
 
 @app.get("/retailers", response_model=RetailersResponse)
 @limiter.limit("100/minute")
 async def get_retailers(request: Request):
     """Get list of supported UK retailers."""
-    return {
-        'retailers': UK_RETAILERS,
-        'count': len(UK_RETAILERS)
-    }
+    return Response(content=_RETAILERS_BODY, media_type="application/json")
 
 
 # =============================================================================
@@ -419,9 +979,19 @@ async def get_retailers(request: Request):
 
 if __name__ == '__main__':
     import uvicorn
-    import os
-    
+
     # Get port from environment variable or default to 8080 (required for Cloud Run)
     port = int(os.environ.get('PORT', 8080))
-    host = '0.0.0.0' 
-    uvicorn.run(app, host=host, port=port)
+    host = '0.0.0.0'
+    # uvloop + httptools beat the default asyncio loop and h11 parser;
+    # proxy_headers keeps client IPs correct behind Cloud Run's load balancer
+    # so the rate limiter keys on the real address.
+    uvicorn.run(
+        "search_api:app",
+        host=host,
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get('WORKERS', '2')),
+        proxy_headers=True
+    )
@@ -8,19 +8,15 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 import os
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import patch, AsyncMock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Mock the Secret Manager before importing search_api
-with patch('google.cloud.secretmanager.SecretManagerServiceClient') as mock_client:
-    mock_instance = MagicMock()
-    mock_response = MagicMock()
-    mock_response.payload.data.decode.return_value = 'fake-secret-value'
-    mock_instance.access_secret_version.return_value = mock_response
-    mock_client.return_value = mock_instance
-    
-    from search_api import app
+# Provide fake credentials before importing search_api
+os.environ.setdefault('GOOGLE_API_KEY', 'fake-api-key')
+os.environ.setdefault('GOOGLE_CX', 'fake-cx')
+
+from search_api import app
 
 client = TestClient(app)
 
@@ -29,7 +25,8 @@ client = TestClient(app)
 @pytest.fixture(autouse=True)
 def mock_google_search():
     """Mock Google Custom Search API to avoid real API calls."""
-    with patch('aiohttp.ClientSession.get') as mock_get:
+    with patch('aiohttp.ClientSession.get') as mock_get, \
+         patch('aiohttp.ClientSession.post') as mock_post:
         mock_response = AsyncMock()
         mock_response.status = 200
         mock_response.json = AsyncMock(return_value={
@@ -42,6 +39,12 @@ def mock_google_search():
             ]
         })
         mock_get.return_value.__aenter__.return_value = mock_response
+
+        # Batch endpoint is unavailable in tests; exercise the per-retailer fallback
+        mock_batch_response = AsyncMock()
+        mock_batch_response.status = 404
+        mock_post.return_value.__aenter__.return_value = mock_batch_response
+
         yield mock_get
 
 
@@ -117,6 +120,135 @@ class TestSearchEndpoint:
         assert response.status_code == 200
 
 
+class TestCredentialsFailFast:
+    """Test the fail-fast path for rejected credentials."""
+
+    def test_search_short_circuits_when_credentials_bad(self):
+        """A tripped credentials flag should surface apiError without searching."""
+        from search_api import app as api_app
+        api_app.state.credentials_ok = False
+        api_app.state.credentials_error = "API key not valid"
+        try:
+            response = client.post("/search", json={"searchQuery": "laptop"})
+            assert response.status_code == 200
+            data = response.json()
+            assert data["success"] is False
+            assert data["apiError"] == "API key not valid"
+            assert data["results"] == []
+        finally:
+            api_app.state.credentials_ok = True
+            api_app.state.credentials_error = None
+
+
+class TestSearchCache:
+    """Test the per-retailer result cache."""
+
+    def test_repeat_query_served_from_cache(self, mock_google_search):
+        """A repeated query should not hit Google again."""
+        import search_api
+        search_api._search_cache.clear()
+
+        payload = {"searchQuery": "cached widget"}
+        response = client.post("/search", json=payload)
+        assert response.status_code == 200
+        calls_after_first = mock_google_search.call_count
+        assert calls_after_first > 0
+
+        response = client.post("/search", json=payload)
+        assert response.status_code == 200
+        assert mock_google_search.call_count == calls_after_first
+
+
+class TestCORS:
+    """Test the chrome-extension CORS middleware."""
+
+    def test_matching_origin_gets_cors_headers(self):
+        """A chrome-extension origin should receive allow-origin headers."""
+        origin = "chrome-extension://" + "a" * 32
+        response = client.get("/health", headers={"Origin": origin})
+        assert response.status_code == 200
+        assert response.headers.get("access-control-allow-origin") == origin
+
+    def test_non_matching_origin_gets_no_cors_headers(self):
+        """Other origins should not receive allow-origin headers."""
+        response = client.get("/health", headers={"Origin": "https://evil.example.com"})
+        assert response.status_code == 200
+        assert "access-control-allow-origin" not in response.headers
+
+    def test_preflight_short_circuits(self):
+        """Preflight requests should be answered by the middleware."""
+        origin = "chrome-extension://" + "b" * 32
+        response = client.options(
+            "/search",
+            headers={
+                "Origin": origin,
+                "Access-Control-Request-Method": "POST",
+            },
+        )
+        assert response.status_code == 200
+        assert response.headers.get("access-control-allow-origin") == origin
+        assert "POST" in response.headers.get("access-control-allow-methods", "")
+
+
+class TestBatchSearch:
+    """Test multipart batch response parsing."""
+
+    def test_parse_batch_response(self):
+        """Should map Content-ID indices to (status, body) pairs."""
+        import search_api
+        boundary = "batch_abc123"
+        raw = (
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            "Content-ID: <response-item0>\r\n"
+            "\r\n"
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json\r\n"
+            "\r\n"
+            '{"items": [{"title": "Batch Product"}]}\r\n'
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            "Content-ID: <response-item1>\r\n"
+            "\r\n"
+            "HTTP/1.1 429 Too Many Requests\r\n"
+            "Content-Type: application/json\r\n"
+            "\r\n"
+            '{"error": {"message": "Quota exceeded"}}\r\n'
+            f"--{boundary}--\r\n"
+        )
+        parts = search_api._parse_batch_response(raw, boundary)
+        assert parts[0][0] == 200
+        assert "Batch Product" in parts[0][1]
+        assert parts[1][0] == 429
+
+    def test_batch_failure_sets_cooldown(self):
+        """A failed batch call should put the endpoint on cooldown."""
+        import time
+        import search_api
+        search_api._batch_unavailable_until = 0.0
+        response = client.post("/search", json={"searchQuery": "cooldown probe"})
+        assert response.status_code == 200
+        assert search_api._batch_unavailable_until > time.monotonic()
+
+
+class TestRetailerSelection:
+    """Test the per-query retailer category filter."""
+
+    def test_specialist_kept_on_keyword_match(self):
+        """A beauty query should keep beauty retailers but drop PC-parts sites."""
+        import search_api
+        selected = search_api.select_retailers("red lipstick")
+        assert "boots.com" in selected
+        assert "scan.co.uk" not in selected
+
+    def test_generalists_always_included(self):
+        """Generalist retailers should survive any query."""
+        import search_api
+        selected = search_api.select_retailers("something unclassifiable")
+        assert "amazon.co.uk" in selected
+        assert "argos.co.uk" in selected
+
+
 class TestErrorHandling:
     """Test error cases."""
     